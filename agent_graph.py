@@ -1,16 +1,25 @@
 import os
 import asyncio
+import logging
+import contextvars
+from uuid import uuid4
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
 from typing import Annotated, Literal, TypedDict
 from dotenv import load_dotenv
 
 # LangChain Imports
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, ToolMessage, message_chunk_to_message
+from langchain_core.globals import set_llm_cache
 from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 from langchain_pinecone import PineconeVectorStore
 from langgraph.graph import StateGraph, END, START
-from langgraph.prebuilt import ToolNode
+from langgraph.prebuilt import ToolNode, InjectedState
+from langgraph.types import Command
 from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
 from psycopg_pool import AsyncConnectionPool
+from psycopg.rows import dict_row
 from langgraph.graph.message import add_messages 
 
 # --- CUSTOM MODULES (Integration) ---
@@ -19,9 +28,12 @@ from hubspot_client import HubSpotManager
 from quote_generator import QuoteGenerator
 from twilio_client import TwilioManager 
 from drive_client import DriveManager
+from retrieval import SemanticCache, EmbeddingBatcher
+from message_rules import classify_intent, TRIVIAL_MSG_RE, _join_within_budget, strip_context_prefix, EMAIL_RE, _find_phone
 
 # 1. Environment & Setup
 load_dotenv()
+logger = logging.getLogger("LOFTY_AGENT")
 wix = WixManager()
 hubspot = HubSpotManager()
 pdf_engine = QuoteGenerator()
@@ -30,6 +42,8 @@ drive = DriveManager()
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
+ADMIN_PHONE = os.getenv("CLIENT_PERSONAL_PHONE") # Felicity/Lorena: lead + callback alerts
+API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000") # Public host for /quotes links
 
 # 2. Setup Pinecone (Brain)
 print("🧠 Initializing Luxury AI Memory...")
@@ -45,61 +59,125 @@ vectorstore = PineconeVectorStore(
     pinecone_api_key=PINECONE_API_KEY
 )
 
+# Semantic cache: paraphrased/repeated questions skip the Pinecone round-trip
+retrieval_cache = SemanticCache()
+# Optional on-disk embedding cache, so repeat queries stay free across restarts/deploys
+EMBED_CACHE_DIR = os.getenv("LOFTY_EMBED_CACHE_DIR")
+query_embeddings = embeddings
+if EMBED_CACHE_DIR:
+    from langchain_classic.embeddings import CacheBackedEmbeddings
+    from langchain_classic.storage import LocalFileStore
+    query_embeddings = CacheBackedEmbeddings.from_bytes_store(
+        embeddings, LocalFileStore(EMBED_CACHE_DIR), namespace="gemini-embedding-001", key_encoder="sha256"
+    )
+
+# Micro-batcher: concurrent users share one embedding API call
+query_embedder = EmbeddingBatcher(query_embeddings)
+
+# Dedicated, bounded pool for the blocking integration SDKs (HubSpot, Twilio, Drive, ReportLab).
+# A burst of slow CRM calls queues here instead of starving asyncio's default executor.
+_IO_POOL = ThreadPoolExecutor(max_workers=16, thread_name_prefix="lofty-io")
+
+async def run_io(fn, *args):
+    """Like asyncio.to_thread (contextvars included), but on _IO_POOL."""
+    ctx = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(_IO_POOL, partial(ctx.run, fn, *args))
+
 # --- 3. HIGH-LEVEL TOOLS (The "Concierge" Suite) ---
-from langchain_core.tools import tool
+from langchain_core.tools import tool, InjectedToolCallId
+
+def _is_contact_id(contact_id):
+    # create_lead returns placeholder strings (error_/existing_user_) on failure
+    return isinstance(contact_id, str) and not contact_id.startswith(("error_", "existing_user_"))
+
+def _tool_result(name, content, tool_call_id, lead=None):
+    """Tool reply that also records this session's CRM lead in the thread state."""
+    update = {"messages": [ToolMessage(content=content, name=name, tool_call_id=tool_call_id)]}
+    if lead:
+        update["lead"] = lead
+    return Command(update=update)
 
 @tool
-def save_lead_to_hubspot(name: str, email: str, phone: str):
+async def save_lead_to_hubspot(name: str, email: str, phone: str, tool_call_id: Annotated[str, InjectedToolCallId]):
     """
     Saves a new lead to HubSpot CRM AND Wix Newsletter.
     Triggers an internal SMS alert to Felicity/Lorena via Twilio.
     """
     status_msg = []
-    
-    # A. Save to CRM
-    contact_id = hubspot.create_lead(name, email, phone)
-    status_msg.append(f"CRM ID: {contact_id}")
+    send_alert = bool(twilio.client and ADMIN_PHONE)
+
+    # A. Save to CRM + B. Sync to Wix Marketing + C. "Call Center" Alert
+    # Independent HTTP calls -> run concurrently (latency = slowest, not sum)
+    jobs = [
+        run_io(hubspot.create_lead, name, email, phone),
+        wix.aadd_contact_to_wix(name, email, phone),
+    ]
+    if send_alert:
+        alert_body = f"🚀 NEW LEAD: {name} ({phone}). Check HubSpot now."
+        jobs.append(run_io(twilio.send_sms, ADMIN_PHONE, alert_body))
 
-    # B. Sync to Wix Marketing
-    wix_success = wix.add_contact_to_wix(name, email, phone)
-    if wix_success: status_msg.append("Wix Sync OK")
+    # return_exceptions: a Wix/Twilio failure must not hide the CRM result
+    contact_id, wix_success, *alert = await asyncio.gather(*jobs, return_exceptions=True)
 
-    # C. "Call Center" Alert (High-Level Feature)
-    if twilio.client:
-        alert_body = f"🚀 NEW LEAD: {name} ({phone}). Check HubSpot now."
-        admin_phone = os.getenv("CLIENT_PERSONAL_PHONE") 
-        if admin_phone:
-            twilio.send_sms(admin_phone, alert_body)
-            status_msg.append("SMS Alert Sent")
+    if isinstance(contact_id, Exception): contact_id = f"Error ({contact_id})"
+    status_msg.append(f"CRM ID: {contact_id}")
+    if wix_success is True: status_msg.append("Wix Sync OK")
+    if alert and not isinstance(alert[0], Exception): status_msg.append("SMS Alert Sent")
 
-    return f"Lead Securely Stored: {', '.join(status_msg)}."
+    lead = None
+    if _is_contact_id(contact_id):
+        lead = {"email": email.strip().lower(), "contact_id": contact_id, "name": name, "phone": phone, "wix_synced": wix_success is True}
+    return _tool_result(save_lead_to_hubspot.name, f"Lead Securely Stored: {', '.join(status_msg)}.", tool_call_id, lead)
 
 @tool
-def generate_quote_and_deal(project_type: str, budget: str, user_name: str, email: str, phone: str):
+async def generate_quote_and_deal(
+    project_type: str, budget: str, user_name: str, email: str, phone: str,
+    state: Annotated[dict, InjectedState], tool_call_id: Annotated[str, InjectedToolCallId]
+):
     """
     Generates a PDF Quote + HubSpot Deal.
     Use this when user wants a formal estimate.
     """
-    # 1. Ensure Lead Exists
-    contact_id = hubspot.create_lead(user_name, email, phone)
-    
+    # 1. Ensure Lead Exists. A contact saved earlier in this conversation is reused:
+    # only changed name/phone is pushed (one update instead of create -> 409 -> search -> update)
+    lead = state.get("lead") or {}
+    known = lead.get("email") == email.strip().lower() and lead.get("contact_id")
+    jobs = []
+    if not known:
+        jobs.append(run_io(hubspot.create_lead, user_name, email, phone))
+    elif (lead.get("name"), lead.get("phone")) != (user_name, phone):
+        jobs.append(run_io(hubspot.update_contact_details, lead["contact_id"], user_name, phone))
+    # Wix newsletter: only if this conversation hasn't synced this contact yet
+    sync_wix = not (known and lead.get("wix_synced"))
+    if sync_wix:
+        jobs.append(wix.aadd_contact_to_wix(user_name, email, phone))
+
+    results = await asyncio.gather(*jobs)
+    contact_id = lead["contact_id"] if known else results[0]
+    wix_synced = results[-1] is True if sync_wix else True
+
+    new_lead = None
+    if _is_contact_id(contact_id):
+        new_lead = {"email": email.strip().lower(), "contact_id": contact_id, "name": user_name, "phone": phone, "wix_synced": wix_synced}
+
+    def reply(content):
+        return _tool_result(generate_quote_and_deal.name, content, tool_call_id, new_lead)
+
     # 2. Create Deal
-    deal_id = hubspot.create_deal_with_quote(contact_id, project_type, budget, "Generating...")
+    deal_id = await run_io(hubspot.create_deal_with_quote, contact_id, project_type, budget, "Generating...")
     
     if "Error" in str(deal_id):
-        return f"System Error: Could not initialize deal ({deal_id})."
+        return reply(f"System Error: Could not initialize deal ({deal_id}).")
 
-    # 3. Generate Luxury PDF
+    # 3. Generate Luxury PDF (ReportLab is CPU-bound -> keep it off the event loop)
     try:
-        result = pdf_engine.generate_pdf(user_name, project_type, budget, deal_id)
+        result = await run_io(pdf_engine.generate_pdf, user_name, project_type, budget, deal_id)
         filename = os.path.basename(result[1]) if isinstance(result, tuple) else os.path.basename(result)
+        pdf_link = f"{API_BASE_URL}/quotes/{filename}"
         
-        base_url = os.getenv("API_BASE_URL", "http://localhost:8000") 
-        pdf_link = f"{base_url}/quotes/{filename}"
-        
-        return f"Quote Generated Successfully. Download Link: {pdf_link}"
+        return reply(f"Quote Generated Successfully. Download Link: {pdf_link}")
     except Exception as e:
-        return f"PDF Generation Error: {str(e)}"
+        return reply(f"PDF Generation Error: {str(e)}")
 
 @tool
 def check_financing_eligibility(budget_concern: str):
@@ -118,19 +196,22 @@ def get_secure_upload_link():
 # --- NEW HIGH-LEVEL TOOLS ---
 
 @tool
-def check_project_status(email: str):
+async def check_project_status(email: str):
     """
     [CLIENT LOGIN FEATURE]
     Checks the status of an active renovation project.
     Returns the current Stage (e.g., 'Demolition', 'Finishing') and Google Drive Folder Link.
     Use when user asks: "How is my project going?", "Updates?", "Login".
     """
-    deal_info = hubspot.get_deal_by_email(email)
+    # HubSpot + Drive lookups are independent -> fetch both at once
+    deal_info, files = await asyncio.gather(
+        run_io(hubspot.get_deal_by_email, email),
+        run_io(drive.get_client_files, email),
+    )
     
     if not deal_info:
         return "No active project found for this email. Please check with your Project Manager."
     
-    files = drive.get_client_files(email)
     file_count = len(files)
     
     return f"""
@@ -142,15 +223,14 @@ def check_project_status(email: str):
     """
 
 @tool
-def request_immediate_callback(phone: str, query: str):
+async def request_immediate_callback(phone: str, query: str):
     """
     [CALL CENTER FEATURE]
     Triggers an emergency/immediate callback request to the Project Manager via Twilio.
     Use when user is frustrated or asks to 'speak to a human'.
     """
-    admin_phone = os.getenv("CLIENT_PERSONAL_PHONE")
-    if admin_phone and twilio.client:
-        twilio.send_sms(admin_phone, f"⚠️ CALLBACK REQUEST: {phone}. Query: {query}")
+    if ADMIN_PHONE and twilio.client:
+        await run_io(twilio.send_sms, ADMIN_PHONE, f"⚠️ CALLBACK REQUEST: {phone}. Query: {query}")
         return "Priority Callback Requested. A Senior Project Manager will call you within 15 minutes."
     return "Request logged. Our team will contact you shortly."
 
@@ -165,6 +245,9 @@ tools = [
 ]
 tool_node = ToolNode(tools)
 
+# Constant-output tools: their result IS the answer, no second model call needed
+STATIC_TOOLS = frozenset({check_financing_eligibility.name, get_secure_upload_link.name})
+
 # 4. Initialize Model (Zero Temperature for Strictness)
 model = ChatGoogleGenerativeAI(
     model="gemini-2.5-flash",
@@ -172,125 +255,82 @@ model = ChatGoogleGenerativeAI(
     temperature=0.0 
 ).bind_tools(tools)
 
+# Informational flows only echo a fixed answer: no reasoning tokens needed (thinking off).
+# The unbound client also writes the history summaries.
+fast_llm = ChatGoogleGenerativeAI(
+    model="gemini-2.5-flash",
+    google_api_key=GOOGLE_API_KEY,
+    temperature=0.0,
+    thinking_budget=0
+)
+fast_model = fast_llm.bind_tools(tools)
+
+# 4b. Optional LLM response cache: identical prompt + history -> no Gemini call.
+# LOFTY_CACHE_BACKEND = none (default) | memory | sqlite | redis
+# LangChain only consults the cache on (a)invoke, so an enabled cache trades token streaming for hits.
+LLM_CACHE_BACKEND = os.getenv("LOFTY_CACHE_BACKEND", "none").lower()
+if LLM_CACHE_BACKEND == "memory":
+    from langchain_core.caches import InMemoryCache as LLMInMemoryCache
+    set_llm_cache(LLMInMemoryCache(maxsize=2048))
+elif LLM_CACHE_BACKEND == "sqlite":
+    from langchain_community.cache import SQLiteCache
+    set_llm_cache(SQLiteCache(database_path=os.getenv("LOFTY_CACHE_PATH", ".lofty_llm_cache.db")))
+elif LLM_CACHE_BACKEND == "redis":
+    import redis # Optional dependency, only needed for this backend
+    from langchain_community.cache import RedisCache
+    set_llm_cache(RedisCache(redis_=redis.Redis.from_url(os.getenv("LOFTY_REDIS_URL", "redis://localhost:6379/0"))))
+
 # --- 5. INTELLIGENT STATE LOGIC ---
 
 class AgentState(TypedDict):
     messages: Annotated[list, add_messages]
     intent: str # 'start', 'pricing', 'design', 'general', etc.
     context: str
+    summary: str # Rolling summary of the messages that fell out of the prompt window
+    lead: dict # CRM contact saved in this conversation: email, contact_id, name, phone, wix_synced
+    summarized: int # messages[:summarized] are folded into `summary`
 
-# NODE 1: Smart Classification (Updated for 8-Flow Logic)
-def classify_intent_node(state: AgentState):
-    """
-    Decides which FLOW (1-8) the user is currently in based on Client Requirements.
-    """
-    last_msg = state["messages"][-1].content.lower()
-    
-    # FLOW 8: Human Handoff
-    if any(x in last_msg for x in ["human", "agent", "call me", "talk to someone", "callback"]):
-        return {"intent": "handoff"}
-    
-    # FLOW 2: Start Project / Residential / Commercial
-    if any(x in last_msg for x in ["start", "build", "renovate", "new project", "addition", "remodel", "commercial", "residential"]):
-        return {"intent": "start_project"}
-
-    # FLOW 3: Design
-    if any(x in last_msg for x in ["design", "architect", "plans", "drawing", "blueprints"]):
-        return {"intent": "design"}
-
-    # FLOW 4: Pricing / Budget
-    if any(x in last_msg for x in ["price", "cost", "budget", "quote", "estimate", "fees", "expensive"]):
-        return {"intent": "pricing"}
-
-    # FLOW 5: Timeline
-    if any(x in last_msg for x in ["how long", "timeline", "schedule", "process", "updates", "time"]):
-        return {"intent": "timeline"}
-
-    # FLOW 6: Permits / Trust
-    if any(x in last_msg for x in ["permit", "license", "insured", "warranty", "inspection", "insurance"]):
-        return {"intent": "permits"}
-
-    # FLOW 7: Why Us / Trust
-    if any(x in last_msg for x in ["why you", "compare", "trust", "best", "portfolio", "reviews"]):
-        return {"intent": "why_us"}
-
-    # Login / Portal Check
-    if any(x in last_msg for x in ["login", "status", "portal", "files"]):
-        return {"intent": "login"}
-        
-    # Flow 2b: Follow up on Plans
-    if "plans" in last_msg or "design help" in last_msg:
-        return {"intent": "start_project_followup"}
-
-    # Default / General Query
-    return {"intent": "general"}
+# --- SYSTEM PROMPTS (built once at import; only the general flow needs context) ---
 
-# NODE 2: Contextual Retrieval
-def retrieve_node(state: AgentState):
-    last_msg = state["messages"][-1].content
-    # Retrieve RAG context from Pinecone
-    docs = vectorstore.similarity_search(last_msg, k=2) 
-    context_text = "\n".join([d.page_content for d in docs])
-    return {"context": context_text}
-
-# NODE 3: The Brain (Generation - Updated for FABDL 8 Flows)
-def generate_node(state: AgentState):
-    intent = state.get("intent", "general")
-    context = state.get("context", "")
-    messages = state["messages"]
-    
-    # A. Sanitizer
-    clean_messages = []
-    for m in messages:
-        if isinstance(m, AIMessage) and not m.content and m.tool_calls:
-            m.content = "Consulting records..." 
-        clean_messages.append(m)
-
-    # --- DYNAMIC SYSTEM PROMPTS BASED ON FLOW ---
-    
-    base_instruction = """
+BASE_INSTRUCTION = """
     You are 'LOFTY', the AI Assistant for F&L Design Builders (Fabdl).
     Your tone is Professional, Welcoming, and Efficient.
     Do NOT use large paragraphs. Use Bullet points.
     Your location: Washington DC, Maryland & Virginia (DMV).
     """
 
-    if intent == "start_project":
-        prompt = f"""{base_instruction}
+FLOW_PROMPTS = {
+    "start_project": BASE_INSTRUCTION + """
         **FLOW: Start a New Project**
         User wants to build or renovate.
         1. Acknowledge excitement.
         2. Ask EXACTLY: "Great! What type of project are you planning? (Residential, Commercial, Renovation, or Addition?)"
-        """
-        
-    elif intent == "start_project_followup":
-        prompt = f"""{base_instruction}
+        """,
+
+    "start_project_followup": BASE_INSTRUCTION + """
         **FLOW: Plans Check**
         Ask EXACTLY: "Do you already have plans, or do you need design help?"
-        """
+        """,
 
-    elif intent == "design":
-        prompt = f"""{base_instruction}
+    "design": BASE_INSTRUCTION + """
         **FLOW: Design Services**
         Explain we are a full Design-Build firm.
         - Yes, design is included in our process.
         - Yes, we work with external architects too.
         - Yes, you are involved in every step.
         End with: "Ready to start your Design Consultation?"
-        """
+        """,
 
-    elif intent == "pricing":
-        prompt = f"""{base_instruction}
+    "pricing": BASE_INSTRUCTION + """
         **FLOW: Pricing & Budget**
         Explain pricing depends on scope/materials.
         - We offer value-engineering to stay in budget.
         - No hidden fees. All costs discussed upfront.
         - Mention: We offer **8-Months Same-As-Cash Financing**.
         - Ask EXACTLY: "Do you have an estimated budget range?"
-        """
+        """,
 
-    elif intent == "timeline":
-        prompt = f"""{base_instruction}
+    "timeline": BASE_INSTRUCTION + """
         **FLOW: Timeline & Process**
         Outline the 5 Steps:
         1. Consultation & Vision
@@ -299,19 +339,17 @@ def generate_node(state: AgentState):
         4. Construction
         5. Final Walkthrough
         Say: "We provide a clear timeline after planning."
-        """
+        """,
 
-    elif intent == "permits":
-        prompt = f"""{base_instruction}
+    "permits": BASE_INSTRUCTION + """
         **FLOW: Permits & Licensing**
         Confirm:
         - Yes, we handle ALL permits and approvals.
         - Yes, we are Fully Licensed & Insured.
         - Yes, we offer Warranties on our work.
-        """
+        """,
 
-    elif intent == "why_us":
-        prompt = f"""{base_instruction}
+    "why_us": BASE_INSTRUCTION + """
         **FLOW: Why Choose Fabdl?**
         Highlight:
         - One-team design & build
@@ -319,61 +357,299 @@ def generate_node(state: AgentState):
         - High-quality craftsmanship
         - Stress-free project management
         - Exclusive partnership with **Venicasa** (Luxury Furniture).
-        """
+        """,
 
-    elif intent == "handoff":
-        prompt = f"""{base_instruction}
+    "handoff": BASE_INSTRUCTION + """
         **FLOW: Human Handoff**
         Say: "I'll connect you with a project specialist immediately."
         Use tool 'request_immediate_callback' if they provide a number.
-        """
-        
-    elif intent == "login":
-        prompt = f"""{base_instruction}
+        """,
+
+    "login": BASE_INSTRUCTION + """
         **FLOW: Client Portal**
         User wants to check status.
         Use the 'check_project_status' tool using their email.
-        """
+        """,
+}
 
-    else:
-        # Greeting / General RAG
-        prompt = f"""{base_instruction}
+# Flows whose script never leads to a tool call (no lead capture, quote, status or callback):
+# answered by fast_model. Tool-calling flows keep thinking to extract name/email/phone reliably.
+FAST_INTENTS = frozenset({"start_project_followup", "design", "timeline", "permits", "why_us"})
+
+# Static flows never change -> one reusable SystemMessage each
+FLOW_SYSTEM_MESSAGES = {intent: SystemMessage(content=prompt) for intent, prompt in FLOW_PROMPTS.items()}
+
+# Greeting / General RAG. Split around the context slot: a turn only concatenates
+# head + context + tail (no str.format parse, no brace escaping in the prompt text)
+GENERAL_PROMPT_HEAD = BASE_INSTRUCTION + """
         **FLOW: General / Greeting**
         If greeting: "👋 Hi! Welcome to F&L Design Builders. How can I help you today?"
-        If specific question, use this context: {context}
+        If specific question, use this context: """
+GENERAL_PROMPT_TAIL = """
         Keep it short.
         """
+# Greetings / acks skip retrieval -> empty context; that variant is built once too
+GENERAL_NO_CONTEXT_MESSAGE = SystemMessage(content=GENERAL_PROMPT_HEAD + GENERAL_PROMPT_TAIL)
+
+# STEP 2: Contextual Retrieval
+async def retrieve_context(last_msg: str) -> str:
+    # Embed once; reuse cached context for semantically similar queries
+    query_vector = await query_embedder.embed(last_msg)
+    context_text = retrieval_cache.lookup(query_vector)
+    if context_text is None:
+        # Retrieve RAG context from Pinecone (MMR keeps the 2 chunks diverse)
+        docs = await vectorstore.amax_marginal_relevance_search_by_vector(query_vector, k=2, fetch_k=8, lambda_mult=0.5)
+        context_text = _join_within_budget(docs)
+        retrieval_cache.store(query_vector, context_text)
+    return context_text
+
+# Text for tool-call turns that came back with no content
+TOOL_CALL_PLACEHOLDER = "Consulting records..."
+
+def _needs_placeholder(m):
+    # Exact type check: history holds plain AIMessages (chunks are merged before checkpointing)
+    return type(m) is AIMessage and not m.content and m.tool_calls
+
+# Prompt window: only the recent messages are sent verbatim, older ones as a summary.
+# Keeps per-turn Gemini input (latency + cost) flat as Instagram threads grow.
+HISTORY_WINDOW = 10
+SUMMARY_BATCH = 10 # Summarize once this many messages have left the window
+
+SUMMARY_PROMPT = """
+    Summarize this conversation between a customer and LOFTY (F&L Design Builders' assistant)
+    in at most 120 words. Keep names, emails, phone numbers, project type, budget, quotes or
+    deals created, and anything promised to the customer. Merge it with the previous summary.
+    """
 
-    final_input = [SystemMessage(content=prompt)] + clean_messages
-    response = model.invoke(final_input)
+def _window_start(messages):
+    start = max(len(messages) - HISTORY_WINDOW, 0)
+    # Begin on a user turn so no tool result is sent without the call that produced it
+    while start > 0 and not isinstance(messages[start], HumanMessage):
+        start -= 1
+    return start
+
+def _content_text(content):
+    if isinstance(content, str):
+        return content
+    return "".join(p.get("text", "") if isinstance(p, dict) else str(p) for p in content)
+
+# NODE 1: Prepare (classify + retrieve in one graph step -> one checkpoint write, not two)
+async def prepare_node(state: AgentState):
+    last_msg = state["messages"][-1].content
+    intent = classify_intent(last_msg)
+    # Only the general prompt uses context; scripted flows skip the embedding + Pinecone call
+    if intent in FLOW_SYSTEM_MESSAGES:
+        return {"intent": intent, "context": ""}
+    # "ok" / "thanks": no lookup, and leaving `context` out keeps the previous turn's context in state
+    if TRIVIAL_MSG_RE.match(strip_context_prefix(last_msg)): # IG turns carry a [CONTEXT: ...] prefix
+        return {"intent": intent}
+    return {"intent": intent, "context": await retrieve_context(last_msg)}
+
+def _direct_tool_call(intent, last_msg):
+    """Returns the tool call the login/handoff flow would make, or None if its argument is missing."""
+    if intent == "login":
+        match = EMAIL_RE.search(last_msg)
+        if match:
+            return {"name": check_project_status.name, "args": {"email": match.group()}}
+    elif intent == "handoff":
+        phone = _find_phone(last_msg)
+        if phone:
+            return {"name": request_immediate_callback.name, "args": {"phone": phone, "query": strip_context_prefix(last_msg)}}
+    return None
+
+def route_after_prepare(state: AgentState) -> Literal["direct_tool", "agent"]:
+    if _direct_tool_call(state["intent"], state["messages"][-1].content):
+        return "direct_tool"
+    return "agent"
+
+# NODE 1b: Direct Tool Call (skips the Gemini round-trip that would only emit this call)
+def direct_tool_node(state: AgentState):
+    call = _direct_tool_call(state["intent"], state["messages"][-1].content)
+    call["id"] = f"call_{uuid4().hex}"
+    return {"messages": [AIMessage(content=TOOL_CALL_PLACEHOLDER, tool_calls=[call])]}
+
+def _static_tool_reply(messages):
+    """Returns the reply text if the tool round that just ran only used STATIC_TOOLS, else None."""
+    results = []
+    for m in reversed(messages):
+        if not isinstance(m, ToolMessage):
+            break
+        if m.name not in STATIC_TOOLS:
+            return None
+        results.append(m.content)
+    return "\n".join(reversed(results)) if results else None
+
+# NODE 2: The Brain (Generation - Updated for FABDL 8 Flows)
+async def generate_node(state: AgentState):
+    intent = state.get("intent", "general")
+    context = state.get("context", "")
+    messages = state["messages"]
+
+    # Back from a constant tool: answer with its output directly (skips a Gemini round-trip)
+    static_reply = _static_tool_reply(messages)
+    if static_reply is not None:
+        return {"messages": [AIMessage(content=static_reply)]}
+    
+    # A. Sanitizer (copy-on-write: never mutate the checkpointed history).
+    # New tool-call turns are patched at creation (below), so only threads saved
+    # before that need the per-message copy; everything else passes straight through.
+    clean_messages = messages
+    if any(_needs_placeholder(m) for m in messages):
+        clean_messages = [
+            m.model_copy(update={"content": TOOL_CALL_PLACEHOLDER}) if _needs_placeholder(m) else m
+            for m in messages
+        ]
+
+    # --- DYNAMIC SYSTEM PROMPTS BASED ON FLOW ---
+    sys_msg = FLOW_SYSTEM_MESSAGES.get(intent)
+    last = messages[-1]
+    fast = (
+        intent in FAST_INTENTS and isinstance(last, HumanMessage)
+        and not (EMAIL_RE.search(last.content) or _find_phone(last.content)) # Contact details -> likely save_lead
+    )
+    llm = fast_model if fast else model
+    if sys_msg is None:
+        sys_msg = SystemMessage(content=GENERAL_PROMPT_HEAD + context + GENERAL_PROMPT_TAIL) if context else GENERAL_NO_CONTEXT_MESSAGE
+
+    # Never drop messages the summary doesn't cover yet
+    summary = state.get("summary", "")
+    start = min(_window_start(clean_messages), state.get("summarized", 0))
+    if summary:
+        sys_msg = SystemMessage(content=sys_msg.content + "\n    Earlier in this conversation: " + summary)
+
+    final_input = [sys_msg, *clean_messages[start:]]
+
+    if LLM_CACHE_BACKEND != "none":
+        # Cache-aware path. Hits hand back the stored message object: copy it with a fresh id
+        # so a repeated answer is appended to the thread instead of replacing the earlier one.
+        response = await llm.ainvoke(final_input)
+        response = response.model_copy(update={"id": None})
+    else:
+        # Stream tokens (graph.astream(stream_mode="messages") sees them as they arrive),
+        # then merge the chunks into one final message for state + should_continue.
+        response = None
+        async for chunk in llm.astream(final_input):
+            response = chunk if response is None else response + chunk
+        response = message_chunk_to_message(response)
+
+    # Gemini rejects empty AI turns on replay: give tool calls their placeholder before they are checkpointed
+    if _needs_placeholder(response):
+        response.content = TOOL_CALL_PLACEHOLDER
     return {"messages": [response]}
 
 def should_continue(state: AgentState) -> Literal["tools", "__end__"]:
     if state["messages"][-1].tool_calls:
         return "tools"
-    return "__end__"
+    return END
+
+_summarizing = set() # thread_ids with a summary refresh in flight
+
+async def summarize_thread(config):
+    """
+    Folds the messages that left the prompt window into the thread's rolling summary.
+    Runs outside the graph, after the reply went out, so this Gemini call never delays
+    (or fails) a user turn. Batched: a no-op until SUMMARY_BATCH messages are pending.
+    """
+    thread_id = config["configurable"]["thread_id"]
+    if thread_id in _summarizing:
+        return
+    _summarizing.add(thread_id)
+    try:
+        app = await get_app()
+        state = (await app.aget_state(config)).values
+        messages = state.get("messages", [])
+        start, end = state.get("summarized", 0), _window_start(messages)
+        if end - start < SUMMARY_BATCH:
+            return
+
+        transcript = "\n".join(
+            f"{m.type}: {_content_text(m.content)}"
+            for m in messages[start:end]
+            if m.content and m.content != TOOL_CALL_PLACEHOLDER
+        )
+        response = await fast_llm.ainvoke([
+            SystemMessage(content=SUMMARY_PROMPT),
+            HumanMessage(content=f"Previous summary: {state.get('summary') or 'None'}\n\nConversation:\n{transcript}"),
+        ])
+        # Written as the agent's update: the finished thread still routes to END
+        await app.aupdate_state(config, {"summary": _content_text(response.content), "summarized": end}, as_node="agent")
+    except Exception as e:
+        # Nothing is lost: `summarized` didn't move, so the next turn retries
+        logger.warning("⚠️ Summary refresh failed for %s: %s", thread_id, e)
+    finally:
+        _summarizing.discard(thread_id)
 
 # --- 6. GRAPH CONSTRUCTION ---
 workflow = StateGraph(AgentState)
-workflow.add_node("classify", classify_intent_node)
-workflow.add_node("retrieve", retrieve_node)
+# No node-level cache on prepare: its keys (whole messages, emails, phones) rarely repeat and
+# LangGraph's InMemoryCache is unbounded. Repeats already hit classify_intent's lru_cache,
+# the EmbeddingBatcher LRU and the SemanticCache, all size-capped.
+workflow.add_node("prepare", prepare_node)
+workflow.add_node("direct_tool", direct_tool_node)
 workflow.add_node("agent", generate_node)
 workflow.add_node("tools", tool_node)
 
-workflow.add_edge(START, "classify")
-workflow.add_edge("classify", "retrieve")
-workflow.add_edge("retrieve", "agent")
-workflow.add_conditional_edges("agent", should_continue)
+workflow.add_edge(START, "prepare")
+workflow.add_conditional_edges("prepare", route_after_prepare, {"direct_tool": "direct_tool", "agent": "agent"})
+workflow.add_edge("direct_tool", "tools")
+workflow.add_conditional_edges("agent", should_continue, {"tools": "tools", END: END})
 workflow.add_edge("tools", "agent")
 
 # --- 7. PRODUCTION COMPILATION ---
+
+class PooledAsyncPostgresSaver(AsyncPostgresSaver):
+    """
+    AsyncPostgresSaver without the instance-wide lock when backed by a pool.
+    The stock saver wraps every cursor in `self.lock` (required when it shares ONE
+    connection), which serializes checkpoint reads/writes across ALL chat sessions.
+    With a pool, each cursor checks out its own connection, so the lock is skipped.
+    Assumption: the pool is the only shared state between concurrent calls.
+    """
+    @asynccontextmanager
+    async def _cursor(self, *, pipeline: bool = False):
+        if self.pipe or not isinstance(self.conn, AsyncConnectionPool):
+            # Single shared connection -> keep the stock (locked) behaviour
+            async with super()._cursor(pipeline=pipeline) as cur:
+                yield cur
+            return
+
+        async with self.conn.connection() as conn:
+            if pipeline and self.supports_pipeline:
+                async with conn.pipeline(), conn.cursor(binary=True, row_factory=dict_row) as cur:
+                    yield cur
+            elif pipeline:
+                async with conn.transaction(), conn.cursor(binary=True, row_factory=dict_row) as cur:
+                    yield cur
+            else:
+                async with conn.cursor(binary=True, row_factory=dict_row) as cur:
+                    yield cur
+
+_app_task = None # Build of the compiled graph (one pool + checkpointer per process)
+
 async def get_app():
+    """
+    Returns the compiled agent, building the DB pool + checkpointer on first call only.
+    Concurrent first requests share the same build; a failed build is retried on the next call.
+    """
+    global _app_task
+    if _app_task is None:
+        _app_task = asyncio.ensure_future(_build_app())
+    task = _app_task
+    try:
+        # shield: a client disconnect must not cancel the build other requests wait on
+        return await asyncio.shield(task)
+    except Exception:
+        if task.done() and _app_task is task:
+            _app_task = None
+        raise
+
+async def _build_app():
     db_url = os.getenv("NEON_DB_URL")
     
     # Connection Arguments (Optimized for Production to prevent Crashes)
     connection_kwargs = {
         "autocommit": True, 
-        "prepare_threshold": 0,
+        "prepare_threshold": 0, # Neon's pooled endpoint is PgBouncer (transaction mode): server-side prepared statements don't survive
         "keepalives": 1,
         "keepalives_idle": 30,
         "keepalives_interval": 10,
@@ -387,14 +663,17 @@ async def get_app():
         kwargs=connection_kwargs, 
         open=False,
         # --- STABILITY SETTINGS ---
-        min_size=1,          # Keep 1 connection alive
-        max_lifetime=120,    # Refresh connection every 2 mins
-        check=AsyncConnectionPool.check_connection, 
+        min_size=5,          # Warm connections for bursts (no TLS + auth handshake on the request path)
+        max_lifetime=120,    # Refresh connection every 2 mins (applied when a connection is returned)
+        max_idle=60,         # Close extras above min_size after 1 idle min
+        # Idle connections are never probed by the pool and max_lifetime isn't applied at checkout,
+        # so a connection Neon dropped during a suspend would fail the turn: verify on checkout
+        check=AsyncConnectionPool.check_connection,
         timeout=10           
     )
     
     await async_pool.open()
-    checkpointer = AsyncPostgresSaver(async_pool)
+    checkpointer = PooledAsyncPostgresSaver(async_pool)
     await checkpointer.setup() 
     app = workflow.compile(checkpointer=checkpointer)
 
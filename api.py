@@ -1,36 +1,48 @@
 import os
+import re
+import json
+import asyncio
+import weakref
 import uvicorn
 import httpx
+import queue
+import random
 import logging
-import textwrap  # <--- NEW IMPORT FOR CHUNKING
+from logging.handlers import QueueHandler, QueueListener
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException, Request, Form, Query, BackgroundTasks
-from fastapi.responses import HTMLResponse, PlainTextResponse
+from fastapi import FastAPI, HTTPException, Request, Form, Query
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from langchain_core.messages import HumanMessage
 from dotenv import load_dotenv
 from fastapi import Response # For TwiML XML response
-from twilio_client import TwilioManager
-from drive_client import DriveManager
 from fastapi.staticfiles import StaticFiles
 from typing import List, Optional
 # --- CUSTOM MODULES IMPORTS ---
 # Make sure these files exist in the same folder
-from agent_graph import get_app
-from hubspot_client import HubSpotManager
+# Managers are shared with the agent (one client per integration per process)
+from agent_graph import get_app, summarize_thread, hubspot, twilio, drive
+from message_rules import split_message, IG_CONTEXT_PREFIXES, BOT_SCRIPT_PREFIX
+from http_clients import async_client
 
 # --- CONFIGURATION & LOGGING ---
 load_dotenv()
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+# Handlers only enqueue; a listener thread does the actual stdout writes,
+# so log calls never block the event loop on a slow pipe.
+_log_queue = queue.SimpleQueue()
+_log_output = logging.StreamHandler()
+_log_output.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+log_listener = QueueListener(_log_queue, _log_output)
+log_listener.start()
+logging.basicConfig(level=logging.INFO, handlers=[QueueHandler(_log_queue)])
 logger = logging.getLogger("LOFTY_API")
 
 
-# Initialize External Managers
-hubspot_manager = HubSpotManager()
-# Initialize Managers
-twilio_manager = TwilioManager()
-drive_manager = DriveManager()
+# External Managers (already initialized by agent_graph)
+hubspot_manager = hubspot
+twilio_manager = twilio
+drive_manager = drive
 # Meta/Instagram Config (From .env)
 VERIFY_TOKEN = os.getenv("META_VERIFY_TOKEN", "secure_token_123") 
 PAGE_ACCESS_TOKEN = os.getenv("PAGE_ACCESS_TOKEN")
@@ -40,18 +52,24 @@ IG_USER_ID = os.getenv("INSTAGRAM_BUSINESS_ID")
 # --- 1. GLOBAL STATE (For AI Brain Persistence) ---
 app_state = {}
 
+# Persist each chat turn with ONE checkpoint write when the run finishes,
+# instead of a Neon round-trip after every graph step (prepare/agent/tools/agent).
+CHECKPOINT_DURABILITY = "exit"
+
 # --- 2. LIFESPAN MANAGER (Async Startup) ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("🚀 Booting up LOFTY API (Unified Production System)...")
+    logger.info("🚀 Booting up LOFTY API (Unified Production System)...")
     try:
         # Initialize LangGraph Agent (Connects to Neon DB Async Pool)
         app_state["agent"] = await get_app()
-        print("✅ LOFTY Agent Loaded & Connected to DB.")
+        logger.info("✅ LOFTY Agent Loaded & Connected to DB.")
     except Exception as e:
-        print(f"❌ Critical Error Loading Agent: {e}")
+        logger.error("❌ Critical Error Loading Agent: %s", e)
     yield
-    print("🛑 Shutting down server...")
+    logger.info("🛑 Shutting down server...")
+    await async_client.aclose()
+    log_listener.stop()
 
 # --- 3. FASTAPI APP SETUP ---
 app = FastAPI(title="F&L Design Builders - Unified Backend", version="3.0", lifespan=lifespan)
@@ -99,76 +117,98 @@ class PortalLoginRequest(BaseModel):
 #  DYNAMIC BUTTON LOGIC (CLIENT'S 8 FLOWS)
 # ============================================================
 
-def get_dynamic_buttons(bot_text: str) -> List[QuickReply]:
-    """
-    Bot ke jawab (text) ko analyze karke sahi buttons select karta hai.
-    Based on Client's FAQ Flows.
-    """
-    text = bot_text.lower()
-
+# Each flow: (trigger phrases in the bot's reply, buttons). Checked in order.
+BUTTON_FLOWS = [
     # FLOW 1: Greeting
-    if "welcome" in text or "help you today" in text:
-        return [
-            QuickReply(label="🏗 Start a New Project", value="I want to start a new project"),
-            QuickReply(label="🎨 Design Services", value="Tell me about design services"),
-            QuickReply(label="💰 Pricing & Budget", value="How much does it cost?"),
-            QuickReply(label="⏳ Timeline", value="How long does it take?"),
-            QuickReply(label="📞 Speak to Human", value="I want to talk to a human")
-        ]
+    (["welcome", "help you today"], [
+        QuickReply(label="🏗 Start a New Project", value="I want to start a new project"),
+        QuickReply(label="🎨 Design Services", value="Tell me about design services"),
+        QuickReply(label="💰 Pricing & Budget", value="How much does it cost?"),
+        QuickReply(label="⏳ Timeline", value="How long does it take?"),
+        QuickReply(label="📞 Speak to Human", value="I want to talk to a human")
+    ]),
 
     # FLOW 2: Start Project -> Type
-    if "type of project" in text or "residential" in text:
-        return [
-            QuickReply(label="🏡 Residential", value="Residential Project"),
-            QuickReply(label="🏢 Commercial", value="Commercial Project"),
-            QuickReply(label="🔄 Renovation", value="Renovation"),
-            QuickReply(label="➕ Addition", value="Home Addition")
-        ]
+    (["type of project", "residential"], [
+        QuickReply(label="🏡 Residential", value="Residential Project"),
+        QuickReply(label="🏢 Commercial", value="Commercial Project"),
+        QuickReply(label="🔄 Renovation", value="Renovation"),
+        QuickReply(label="➕ Addition", value="Home Addition")
+    ]),
 
     # FLOW 2 (Part B): Plans?
-    if "have plans" in text or "design help" in text:
-        return [
-            QuickReply(label="✔ Yes, I have plans", value="I already have plans"),
-            QuickReply(label="✏ No, need design", value="I need design help")
-        ]
+    (["have plans", "design help"], [
+        QuickReply(label="✔ Yes, I have plans", value="I already have plans"),
+        QuickReply(label="✏ No, need design", value="I need design help")
+    ]),
 
     # FLOW 3: Design CTA
-    if "design-build" in text or "architect" in text:
-        return [
-            QuickReply(label="📐 Start Consultation", value="Book a Design Consultation"),
-            QuickReply(label="🏗 View Process", value="How does the process work?")
-        ]
+    (["design-build", "architect"], [
+        QuickReply(label="📐 Start Consultation", value="Book a Design Consultation"),
+        QuickReply(label="🏗 View Process", value="How does the process work?")
+    ]),
 
     # FLOW 4: Pricing -> Budget Range
-    if "budget range" in text or "estimated budget" in text:
-        return [
-            QuickReply(label="Under $50K", value="Budget is under $50k"),
-            QuickReply(label="$50K–$150K", value="Budget is $50k-$150k"),
-            QuickReply(label="$150K+", value="Budget is $150k+"),
-            QuickReply(label="Not sure", value="I am not sure about budget")
-        ]
+    (["budget range", "estimated budget"], [
+        QuickReply(label="Under $50K", value="Budget is under $50k"),
+        QuickReply(label="$50K–$150K", value="Budget is $50k-$150k"),
+        QuickReply(label="$150K+", value="Budget is $150k+"),
+        QuickReply(label="Not sure", value="I am not sure about budget")
+    ]),
 
     # FLOW 5: Timeline
-    if "timeline" in text or "5 steps" in text:
-        return [
-            QuickReply(label="📅 Book Consultation", value="Schedule a consultation"),
-            QuickReply(label="📞 Call Specialist", value="Call a specialist")
-        ]
+    (["timeline", "5 steps"], [
+        QuickReply(label="📅 Book Consultation", value="Schedule a consultation"),
+        QuickReply(label="📞 Call Specialist", value="Call a specialist")
+    ]),
 
     # FLOW 8: Handoff / CTA
-    if "connect you" in text or "specialist" in text or "consultation" in text:
-        return [
-            QuickReply(label="📅 Book Now", value="Book a meeting"),
-            QuickReply(label="📞 Request Call", value="Request a callback"),
-            QuickReply(label="📧 Send Email", value="Send an email")
-        ]
-
-    # DEFAULT (Fallback)
-    return [
-        QuickReply(label="📅 Book Consultation", value="Book a meeting"),
-        QuickReply(label="💬 Services", value="What services do you offer?"),
-        QuickReply(label="💰 Get Quote", value="Get a quote")
-    ]
+    (["connect you", "specialist", "consultation"], [
+        QuickReply(label="📅 Book Now", value="Book a meeting"),
+        QuickReply(label="📞 Request Call", value="Request a callback"),
+        QuickReply(label="📧 Send Email", value="Send an email")
+    ]),
+]
+
+# DEFAULT (Fallback)
+DEFAULT_BUTTONS = [
+    QuickReply(label="📅 Book Consultation", value="Book a meeting"),
+    QuickReply(label="💬 Services", value="What services do you offer?"),
+    QuickReply(label="💰 Get Quote", value="Get a quote")
+]
+
+# Compiled once: one case-insensitive scan per flow instead of lower() + N substring checks
+BUTTON_RULES = [
+    (re.compile("|".join(re.escape(p) for p in phrases), re.IGNORECASE), buttons)
+    for phrases, buttons in BUTTON_FLOWS
+]
+
+def get_dynamic_buttons(bot_text: str) -> List[QuickReply]:
+    """
+    Bot ke jawab (text) ko analyze karke sahi buttons select karta hai.
+    Based on Client's FAQ Flows.
+    """
+    for pattern, buttons in BUTTON_RULES:
+        if pattern.search(bot_text):
+            return buttons
+
+    return DEFAULT_BUTTONS
+
+def message_text(content, sep: str = "") -> str:
+    """
+    Gemini content can be a plain string or a list of parts (dicts/strings).
+    Returns only the text parts joined together.
+    """
+    if not isinstance(content, list):
+        return str(content)
+
+    parts = []
+    for item in content:
+        if isinstance(item, dict) and item.get("type", "text") == "text":
+            parts.append(item.get("text", ""))
+        elif isinstance(item, str):
+            parts.append(item)
+    return sep.join(parts)
 
 # ============================================================
 #  SECTION A: INSTAGRAM AUTOMATION (Async & Background)
@@ -176,6 +216,41 @@ def get_dynamic_buttons(bot_text: str) -> List[QuickReply]:
 # ============================================================
 
 # 1. HELPER: Send Message via Meta API (Async)
+# Sends are not idempotent (a resent POST is a duplicate DM / public comment), so only
+# failures where Meta provably didn't take the message are retried: 429 and connection setup
+META_MAX_ATTEMPTS = 3
+META_RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+async def _post_meta_chunk(url: str, payload: dict, recipient_id: str, i: int, total: int):
+    for attempt in range(1, META_MAX_ATTEMPTS + 1):
+        try:
+            logger.debug("📤 Sending Reply Chunk %d/%d to Meta (attempt %d)...", i + 1, total, attempt)
+
+            response = await async_client.post(url, json=payload, timeout=10.0) # Shared keep-alive pool
+
+            if response.status_code == 200:
+                logger.info("✅ Meta Reply Chunk %d Sent to %s", i + 1, recipient_id)
+                return
+            # 4xx (bad token, closed window...) won't succeed on retry; a 5xx may already be delivered
+            if response.status_code != 429 or attempt == META_MAX_ATTEMPTS:
+                logger.error("❌ Meta API Error on Chunk %d: %s", i + 1, response.text)
+                return
+            logger.warning("⏳ Meta API rate limit on Chunk %d, retrying...", i + 1)
+
+        except META_RETRYABLE_ERRORS as e:
+            if attempt == META_MAX_ATTEMPTS:
+                logger.error("⚠️ Network Error sending to Meta: %s", e)
+                return
+            logger.warning("⏳ Could not reach Meta (%s), retrying...", e)
+
+        except Exception as e:
+            # Read timeouts etc.: the POST may have landed -> don't resend
+            logger.error("⚠️ Network Error sending to Meta (chunk %d may have been delivered): %s", i + 1, e)
+            return
+
+        # 0.5s, 1s (+ up to 0.5s jitter so concurrent senders don't retry in lockstep)
+        await asyncio.sleep(min(0.5 * 2 ** (attempt - 1), 8) + random.uniform(0, 0.5))
+
 async def send_meta_reply_http(recipient_id: str, text: str, type: str):
     """
     Sends the final text back to Instagram User via Graph API.
@@ -186,59 +261,63 @@ async def send_meta_reply_http(recipient_id: str, text: str, type: str):
         return
 
     # --- MESSAGE SPLITTER LOGIC ---
-    # Break message into 950 char chunks (Leaving 50 chars buffer)
-    chunks = textwrap.wrap(text, width=950, replace_whitespace=False, drop_whitespace=False)
+    # Break message into <=950 char chunks on sentence boundaries
+    chunks = split_message(text)
 
-    async with httpx.AsyncClient() as client:
-        # UPDATED: Using graph.instagram.com based on official docs for User Tokens
-        base_url = "https://graph.instagram.com/v21.0"
-        
+    # UPDATED: Using graph.instagram.com based on official docs for User Tokens
+    base_url = "https://graph.instagram.com/v21.0"
+
+    if type == "dm":
+        # Doc: POST /<IG_ID>/messages
+        # DM chunks must arrive in order -> one at a time
+        url = f"{base_url}/{IG_USER_ID}/messages?access_token={PAGE_ACCESS_TOKEN}"
         for i, chunk in enumerate(chunks):
-            url = ""
-            payload = {}
-            
-            try:
-                if type == "dm":
-                    # Doc: POST /<IG_ID>/messages
-                    url = f"{base_url}/{IG_USER_ID}/messages?access_token={PAGE_ACCESS_TOKEN}"
-                    payload = {
-                        "recipient": {"id": recipient_id},
-                        "message": {"text": chunk}
-                    }
-                
-                elif type == "comment":
-                    # Comments usually work via: /<COMMENT_ID>/replies
-                    url = f"{base_url}/{recipient_id}/replies?access_token={PAGE_ACCESS_TOKEN}"
-                    payload = {"message": chunk}
-                    
-                print(f"📤 Sending Reply Chunk {i+1}/{len(chunks)} to Meta ({len(chunk)} chars)...") 
-                
-                response = await client.post(url, json=payload, timeout=10.0)
-                
-                if response.status_code == 200:
-                    logger.info(f"✅ Meta Reply Chunk {i+1} Sent to {recipient_id}")
-                else:
-                    logger.error(f"❌ Meta API Error on Chunk {i+1}: {response.text}")
-
-            except Exception as e:
-                logger.error(f"⚠️ Network Error sending to Meta: {e}")
+            payload = {
+                "recipient": {"id": recipient_id},
+                "message": {"text": chunk}
+            }
+            await _post_meta_chunk(url, payload, recipient_id, i, len(chunks))
+
+    elif type == "comment":
+        # Comments usually work via: /<COMMENT_ID>/replies
+        # Each chunk is its own reply, shown in posting order -> one at a time as well
+        url = f"{base_url}/{recipient_id}/replies?access_token={PAGE_ACCESS_TOKEN}"
+        for i, chunk in enumerate(chunks):
+            await _post_meta_chunk(url, {"message": chunk}, recipient_id, i, len(chunks))
+
+# Cap on Instagram events running the agent at once (keeps Gemini under its rate limits)
+AGENT_CONCURRENCY = asyncio.Semaphore(int(os.getenv("AGENT_MAX_CONCURRENCY", "8")))
+# One lock per thread: a user's messages are answered in order, different users in parallel.
+# Weak values -> a lock disappears once nobody holds or waits on it.
+_thread_locks = weakref.WeakValueDictionary()
+_background_tasks = set() # Strong refs so fire-and-forget tasks aren't garbage-collected
+
+def _thread_lock(target_id: str) -> asyncio.Lock:
+    lock = _thread_locks.get(target_id)
+    if lock is None:
+        lock = _thread_locks[target_id] = asyncio.Lock()
+    return lock
+
+def spawn_background(coro):
+    """Runs `coro` as its own task: webhook events don't wait on each other, summaries don't wait on replies."""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
 
 # 2. HELPER: Process Logic (The Brain) - Runs in Background
 async def process_instagram_event(target_id: str, user_text: str, type: str):
     """
     This runs in the BACKGROUND. It calls the AI Agent and then sends the reply.
     """
-    logger.info(f"🧠 Processing {type} from {target_id}...")
+    logger.info("🧠 Processing %s from %s...", type, target_id)
     
+    async with _thread_lock(target_id):
+        await _answer_instagram_event(target_id, user_text, type)
+
+async def _answer_instagram_event(target_id: str, user_text: str, type: str):
     try:
         # Context Injection for the AI (To guide the persona)
-        context_prefix = ""
-        if type == "comment":
-            context_prefix = "[CONTEXT: User commented on an Instagram Post. Keep reply public, short, engaging, and luxury tone.] "
-        elif type == "dm":
-            context_prefix = "[CONTEXT: User sent a Direct Message. Be helpful, warm, act as a concierge.] "
-
-        final_msg = context_prefix + user_text
+        final_msg = IG_CONTEXT_PREFIXES.get(type, "") + user_text
         
         # Call LangGraph Agent
         agent = app_state.get("agent")
@@ -248,25 +327,26 @@ async def process_instagram_event(target_id: str, user_text: str, type: str):
             # Unique Thread ID for Instagram Users (Persistent Memory)
             config = {"configurable": {"thread_id": f"ig_{target_id}"}}
             
-            response_text = ""
-            async for event in agent.astream({"messages": [HumanMessage(content=final_msg)]}, config=config):
-                if "agent" in event:
-                    raw_content = event["agent"]["messages"][-1].content
-                    # Clean Response logic (Handling List vs String)
-                    if isinstance(raw_content, list):
-                        parts = [item.get("text", "") if isinstance(item, dict) else str(item) for item in raw_content]
-                        response_text = "".join(parts)
-                    else:
-                        response_text = str(raw_content)
+            # Keep only the latest agent message; extract its text once at the end
+            last_ai = None
+            async with AGENT_CONCURRENCY:
+                async for event in agent.astream({"messages": [HumanMessage(content=final_msg)]}, config=config, durability=CHECKPOINT_DURABILITY):
+                    if "agent" in event:
+                        last_ai = event["agent"]["messages"][-1]
             
+            response_text = message_text(last_ai.content) if last_ai else ""
             if response_text:
                 ai_reply = response_text
 
         # Send Reply via Meta API (Now handles chunks)
         await send_meta_reply_http(target_id, ai_reply, type)
 
+        # Reply is out: refresh the thread summary without holding up the user's next message
+        if agent:
+            spawn_background(summarize_thread(config))
+
     except Exception as e:
-        logger.error(f"⚠️ AI Processing Error: {e}")
+        logger.error("⚠️ AI Processing Error: %s", e)
 
 # 3. WEBHOOK VERIFICATION (Meta Challenge)
 @app.get("/webhook")
@@ -285,7 +365,7 @@ async def verify_webhook(
 
 # 4. WEBHOOK LISTENER (The Entry Point)
 @app.post("/webhook")
-async def handle_webhook(request: Request, background_tasks: BackgroundTasks):
+async def handle_webhook(request: Request):
     """
     Receives events from Meta.
     UPDATED: Includes Debug Prints & Standby Support.
@@ -294,47 +374,45 @@ async def handle_webhook(request: Request, background_tasks: BackgroundTasks):
         # 1. Get Raw Data
         payload = await request.json()
         
-        # 🔍 JASOOSI LOG
-        print("\n" + "="*50)
-        print(f"📨 INCOMING PAYLOAD: {payload}")
-        print("="*50 + "\n")
+        # 🔍 JASOOSI LOG (debug level + lazy args: the full payload is only formatted when enabled)
+        logger.debug("📨 INCOMING PAYLOAD: %s", payload)
 
         for entry in payload.get("entry", []):
             
             # --- A. Handle PRIMARY DMs (Messaging) ---
             if "messaging" in entry:
-                print("🔹 Event Type: Messaging (Primary)")
+                logger.debug("🔹 Event Type: Messaging (Primary)")
                 for event in entry["messaging"]:
                     sender_id = event.get("sender", {}).get("id")
                     message = event.get("message", {})
                     text = message.get("text")
                     
                     if message.get("is_echo"):
-                        print("ℹ️ Detected Echo (Bot's own message). Skipping.")
+                        logger.debug("ℹ️ Detected Echo (Bot's own message). Skipping.")
                         continue
 
                     if text and sender_id:
-                        print(f"✅ MESSAGE RECEIVED from {sender_id}: {text}")
+                        logger.info("✅ MESSAGE RECEIVED from %s: %s", sender_id, text)
                         # Action: Process in Background
-                        background_tasks.add_task(process_instagram_event, sender_id, text, "dm")
+                        spawn_background(process_instagram_event(sender_id, text, "dm"))
                     else:
-                        print("⚠️ Messaging event received, but no text found.")
+                        logger.warning("⚠️ Messaging event received, but no text found.")
 
             # --- B. Handle STANDBY DMs ---
             elif "standby" in entry:
-                print("🟠 Event Type: STANDBY (Message Requests)")
+                logger.debug("🟠 Event Type: STANDBY (Message Requests)")
                 for event in entry["standby"]:
                     sender_id = event.get("sender", {}).get("id")
                     message = event.get("message", {})
                     text = message.get("text")
 
                     if text and sender_id and not message.get("is_echo"):
-                        print(f"✅ STANDBY MESSAGE processed from {sender_id}: {text}")
-                        background_tasks.add_task(process_instagram_event, sender_id, text, "dm")
+                        logger.info("✅ STANDBY MESSAGE processed from %s: %s", sender_id, text)
+                        spawn_background(process_instagram_event(sender_id, text, "dm"))
 
             # --- C. Handle COMMENTS ---
             elif "changes" in entry:
-                print("🔹 Event Type: Changes (Comment/Post)")
+                logger.debug("🔹 Event Type: Changes (Comment/Post)")
                 for change in entry["changes"]:
                     if change.get("field") == "comments":
                         value = change.get("value", {})
@@ -346,14 +424,13 @@ async def handle_webhook(request: Request, background_tasks: BackgroundTasks):
                             continue 
                         
                         if text:
-                            print(f"💬 COMMENT RECEIVED from {user_id}: {text}")
-                            background_tasks.add_task(process_instagram_event, comment_id, text, "comment")
+                            logger.info("💬 COMMENT RECEIVED from %s: %s", user_id, text)
+                            spawn_background(process_instagram_event(comment_id, text, "comment"))
 
         return {"status": "ok"}
 
     except Exception as e:
-        print(f"❌ Webhook CRASH: {e}")
-        logger.error(f"❌ Webhook Parse Error: {e}")
+        logger.error("❌ Webhook CRASH: %s", e)
         return {"status": "error", "message": str(e)}
 
 # ============================================================
@@ -362,7 +439,7 @@ async def handle_webhook(request: Request, background_tasks: BackgroundTasks):
 
 @app.post("/portal/get-data")
 async def get_portal_data(request: PortalLoginRequest):
-    print(f"🔍 Checking Portal for: {request.email}")
+    logger.info("🔍 Checking Portal for: %s", request.email)
     
     # 1. HubSpot se Project Details lo (Existing Code)
     deal_data = hubspot_manager.get_deal_by_email(request.email)
@@ -398,7 +475,7 @@ async def get_portal_data(request: PortalLoginRequest):
 @app.post("/twilio/voice")
 async def handle_voice_call(request: Request):
     """Twilio yahan call bhejega jab koi number dial karega."""
-    print("📞 Incoming Voice Call...")
+    logger.info("📞 Incoming Voice Call...")
     xml_response = twilio_manager.handle_incoming_call()
     return Response(content=xml_response, media_type="application/xml")
 
@@ -409,34 +486,33 @@ async def handle_sms(request: Request):
     sender_number = form_data.get("From")
     message_body = form_data.get("Body")
     
-    print(f"📩 SMS from {sender_number}: {message_body}")
+    logger.info("📩 SMS from %s: %s", sender_number, message_body)
     
     # Send to AI Agent (Lofty)
     agent = app_state.get("agent")
     if agent:
         config = {"configurable": {"thread_id": f"sms_{sender_number}"}}
         response_text = "Checking..."
+        last_ai = None
         
-        async for event in agent.astream({"messages": [HumanMessage(content=message_body)]}, config=config):
+        async for event in agent.astream({"messages": [HumanMessage(content=message_body)]}, config=config, durability=CHECKPOINT_DURABILITY):
              if "agent" in event:
-                # --- FIX: Extract clean text from LangChain response ---
-                raw_content = event["agent"]["messages"][-1].content
-                
-                # Agar response list hai (JSON), to usay text mein convert karo
-                if isinstance(raw_content, list):
-                    response_text = " ".join([item.get("text", "") for item in raw_content if isinstance(item, dict)])
-                else:
-                    response_text = str(raw_content)
+                last_ai = event["agent"]["messages"][-1]
+        
+        # --- FIX: Extract clean text from LangChain response ---
+        if last_ai:
+            response_text = message_text(last_ai.content, sep=" ")
         
         # Reply via Twilio (Clean Text)
         twilio_manager.send_sms(sender_number, response_text)
+        spawn_background(summarize_thread(config))
         
     return "OK"
 
 @app.get("/quote/accept", response_class=HTMLResponse)
 async def accept_quote(deal_id: str):
     """HubSpot Update + Success Page."""
-    print(f"🎉 Quote Accepted: {deal_id}")
+    logger.info("🎉 Quote Accepted: %s", deal_id)
     hubspot_manager.update_deal_stage(deal_id, "closedwon")
     
     return """
@@ -491,7 +567,7 @@ async def reject_quote_form(deal_id: str):
 
 @app.post("/quote/reject/submit", response_class=HTMLResponse)
 async def reject_quote_submit(deal_id: str = Form(...), reason: str = Form(...)):
-    print(f"📉 Quote Rejected: {deal_id} Reason: {reason}")
+    logger.info("📉 Quote Rejected: %s Reason: %s", deal_id, reason)
     hubspot_manager.update_deal_stage(deal_id, "closedlost")
     hubspot_manager.add_note_to_deal(deal_id, f"REJECTED: {reason}")
     return "<html><body style='text-align:center; padding:50px; font-family:Helvetica;'><h3>Thank you. Your feedback has been recorded.</h3></body></html>"
@@ -506,13 +582,13 @@ async def reject_quote_submit(deal_id: str = Form(...), reason: str = Form(...))
 @app.post("/capture-lead")
 async def capture_lead(data: dict):
     """Wix frontend se lead capture karne ke liye."""
-    print(f"📥 New Lead from Website: {data}")
+    logger.info("📥 New Lead from Website: %s", data)
     # Aap yahan HubSpot manager use karke contact create kar sakte hain
     try:
         hubspot_manager.create_or_update_contact(email=data.get("email"), firstname=data.get("name"), phone=data.get("phone"))
         return {"status": "success", "message": "Lead captured in HubSpot"}
     except Exception as e:
-        logger.error(f"❌ HubSpot Lead Sync Error: {e}")
+        logger.error("❌ HubSpot Lead Sync Error: %s", e)
         return {"status": "error", "message": str(e)}
 
 @app.post("/chat", response_model=ChatResponse)
@@ -528,37 +604,30 @@ async def chat_endpoint(request: ChatRequest):
         user_msg = request.message
         
         if request.platform == "bot_script":
-             print(f"🤖 Automated Script Query: {user_msg}")
-             user_msg = f"[Context: Reply short for Instagram Comment]: {user_msg}"
+             logger.info("🤖 Automated Script Query: %s", user_msg)
+             user_msg = BOT_SCRIPT_PREFIX + user_msg
 
         config = {"configurable": {"thread_id": request.session_id}}
         
-        final_response = ""
+        last_ai = None
         tool_executed = False
         
         async for event in agent.astream(
             {"messages": [HumanMessage(content=user_msg)]},
-            config=config
+            config=config,
+            durability=CHECKPOINT_DURABILITY
         ):
             if "agent" in event:
-                raw_content = event["agent"]["messages"][-1].content
-                if isinstance(raw_content, list):
-                    parts = []
-                    for item in raw_content:
-                        if isinstance(item, dict) and item.get("type") == "text":
-                            parts.append(item.get("text", ""))
-                        elif isinstance(item, str):
-                            parts.append(item)
-                    final_response = "".join(parts)
-                else:
-                    final_response = str(raw_content)
+                last_ai = event["agent"]["messages"][-1]
             
             if "tools" in event:
                 tool_executed = True
 
+        final_response = message_text(last_ai.content) if last_ai else ""
         if not final_response:
             final_response = "Checking design records... One moment."
         dynamic_buttons = get_dynamic_buttons(final_response)
+        spawn_background(summarize_thread(config))
 
         return ChatResponse(
             response=final_response,
@@ -567,9 +636,66 @@ async def chat_endpoint(request: ChatRequest):
         )
 
     except Exception as e:
-        print(f"⚠️ Chat Error: {str(e)}")
+        logger.error("⚠️ Chat Error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """
+    Streaming variant of /chat (Server-Sent Events).
+    Emits {"type": "token"} events as Gemini generates, then one {"type": "done"} event
+    carrying the same fields as ChatResponse.
+    """
+    agent = app_state.get("agent")
+    if not agent:
+        raise HTTPException(status_code=503, detail="AI Agent is still loading... Please retry in 5s.")
+
+    user_msg = request.message
+    if request.platform == "bot_script":
+        user_msg = BOT_SCRIPT_PREFIX + user_msg
+
+    config = {"configurable": {"thread_id": request.session_id}}
+
+    def sse(payload: dict) -> str:
+        return f"data: {json.dumps(payload)}\n\n"
+
+    async def event_stream():
+        last_ai = None
+        tool_executed = False
+        try:
+            async for mode, chunk in agent.astream(
+                {"messages": [HumanMessage(content=user_msg)]},
+                config=config,
+                stream_mode=["messages", "updates"],
+                durability=CHECKPOINT_DURABILITY
+            ):
+                if mode == "messages":
+                    message, metadata = chunk
+                    if metadata.get("langgraph_node") == "agent":
+                        text = message_text(message.content)
+                        if text:
+                            yield sse({"type": "token", "text": text})
+                elif "agent" in chunk:
+                    last_ai = chunk["agent"]["messages"][-1]
+                elif "tools" in chunk:
+                    tool_executed = True
+
+            final_response = message_text(last_ai.content) if last_ai else ""
+            if not final_response:
+                final_response = "Checking design records... One moment."
+            yield sse({
+                "type": "done",
+                "response": final_response,
+                "actions": ["lead_captured"] if tool_executed else [],
+                "quick_replies": [b.model_dump() for b in get_dynamic_buttons(final_response)]
+            })
+            spawn_background(summarize_thread(config))
+        except Exception as e:
+            logger.error("⚠️ Chat Stream Error: %s", e)
+            yield sse({"type": "error", "detail": str(e)})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 @app.get("/")
 async def health_check():
     return {"status": "active", "system": "F&L Unified Backend", "version": "3.0", "concurrency": "enabled"}
@@ -1,4 +1,5 @@
 import os
+import threading
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from dotenv import load_dotenv
@@ -10,29 +11,44 @@ SERVICE_ACCOUNT_FILE = 'credentials.json' # Ye file Google Cloud se download krn
 
 class DriveManager:
     def __init__(self):
-        self.service = None
+        self.creds = None
+        # googleapiclient services (httplib2 underneath) are not thread-safe:
+        # each worker thread gets its own, built on first use from the shared credentials
+        self._local = threading.local()
         if os.path.exists(SERVICE_ACCOUNT_FILE):
             try:
                 creds = service_account.Credentials.from_service_account_file(
                     SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-                self.service = build('drive', 'v3', credentials=creds)
+                self._local.service = build('drive', 'v3', credentials=creds)
+                self.creds = creds # Set only once a service built fine
                 print("✅ Google Drive Connected.")
             except Exception as e:
                 print(f"⚠️ Drive Auth Error: {e}")
         else:
             print("⚠️ 'credentials.json' not found. Drive features disabled.")
 
+    @property
+    def service(self):
+        """This thread's Drive service (None when Drive is disabled)."""
+        if self.creds is None:
+            return None
+        service = getattr(self._local, "service", None)
+        if service is None:
+            service = self._local.service = build('drive', 'v3', credentials=self.creds)
+        return service
+
     def get_client_files(self, client_email):
         """
         Client ki email se uska folder dhoondta hai aur files list karta hai.
         Assumption: Folder ka naam client ka email ya naam hai.
         """
-        if not self.service: return []
+        service = self.service
+        if not service: return []
 
         try:
             # 1. Search for Folder with Client's Email/Name
             query = f"mimeType = 'application/vnd.google-apps.folder' and name contains '{client_email}' and trashed = false"
-            results = self.service.files().list(q=query, fields="files(id, name)").execute()
+            results = service.files().list(q=query, fields="files(id, name)").execute()
             folders = results.get('files', [])
 
             if not folders:
@@ -42,7 +58,7 @@ class DriveManager:
 
             # 2. List Files inside that Folder
             file_query = f"'{folder_id}' in parents and trashed = false"
-            file_results = self.service.files().list(
+            file_results = service.files().list(
                 q=file_query, 
                 fields="files(id, name, webViewLink, thumbnailLink)"
             ).execute()
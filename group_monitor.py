@@ -1,3 +1,4 @@
+import re
 import time
 import random
 import requests
@@ -28,6 +29,7 @@ TARGET_GROUPS = [
 ]
 
 KEYWORDS = ["plumber", "painter", "renovation", "contractor", "kitchen", "bathroom", "remodel", "handyman"]
+KEYWORD_RE = re.compile("|".join(re.escape(k) for k in KEYWORDS)) # One scan per post instead of one per keyword
 
 # --- 1. BROWSER SETUP (DESKTOP MODE) ---
 def setup_browser():
@@ -193,7 +195,7 @@ def monitor_groups(driver):
                     text = post.text.lower()
                     
                     # Keyword Matching
-                    if any(word in text for word in KEYWORDS):
+                    if KEYWORD_RE.search(text):
                         print(f"🔥 MATCH FOUND: {text[:50]}...")
                         
                         # Get Post Link
@@ -0,0 +1,19 @@
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- SHARED HTTP SESSION ---
+# One keep-alive connection pool for sync REST calls made from worker threads (HubSpot notes).
+# Reusing it skips a fresh TCP + TLS handshake on every tool call.
+session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=10, pool_maxsize=50)
+session.mount("https://", _adapter)
+session.mount("http://", _adapter)
+
+# --- SHARED ASYNC HTTP CLIENT ---
+# Keep-alive pool for calls made from the event loop (Meta Graph API replies, Wix webhook).
+# Closed by api.py's lifespan on shutdown.
+async_client = httpx.AsyncClient(
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+    timeout=10.0
+)
@@ -1,13 +1,13 @@
 import os
 import re
 import time
-import requests
 from hubspot import HubSpot
 from hubspot.crm.contacts import SimplePublicObjectInput as ContactInput
 from hubspot.crm.deals import SimplePublicObjectInput as DealInput
 from hubspot.crm.contacts.exceptions import ApiException
 from hubspot.crm.deals.exceptions import ApiException as DealApiException
 from dotenv import load_dotenv
+from http_clients import session
 
 # 1. Load Environment Variables
 load_dotenv()
@@ -249,7 +249,7 @@ class HubSpotManager:
         }
         
         try:
-            response = requests.post(url, headers=headers, json=data)
+            response = session.post(url, headers=headers, json=data)
             if response.status_code in [200, 201]:
                 print(f"📝 Note added to Deal {deal_id}: {note_content}")
                 return True
@@ -1,3 +1,4 @@
+import re
 import time
 import random
 import os
@@ -29,6 +30,7 @@ TARGET_GROUPS = [
 ]
 
 KEYWORDS = ["plumber", "painter", "renovation", "contractor", "kitchen", "bathroom", "remodel", "handyman", "builder"]
+KEYWORD_RE = re.compile("|".join(re.escape(k) for k in KEYWORDS)) # One scan per post instead of one per keyword
 
 # --- BROWSER SETUP (Desktop Mode for Stability) ---
 def setup_browser():
@@ -157,7 +159,7 @@ def process_facebook_groups(driver):
                 for post in posts[:5]: # Check top 5 posts
                     text = post.text.lower()
                     
-                    if any(kw in text for kw in KEYWORDS):
+                    if KEYWORD_RE.search(text):
                         logging.info(f"🎯 LEAD FOUND: {text[:50]}...")
                         
                         # Recommendation Text
@@ -0,0 +1,124 @@
+import re
+from functools import lru_cache
+from typing import List
+
+# Pure text rules shared by the graph and the API: no I/O, no LangChain, safe to import anywhere.
+
+# FLOW KEYWORDS (priority order). Sets are compiled once into one case-insensitive regex.
+INTENT_KEYWORDS = [
+    # FLOW 8: Human Handoff
+    ("handoff", frozenset({"human", "agent", "call me", "talk to someone", "callback"})),
+    # FLOW 2: Start Project / Residential / Commercial
+    ("start_project", frozenset({"start", "build", "renovate", "new project", "addition", "remodel", "commercial", "residential"})),
+    # FLOW 3: Design
+    ("design", frozenset({"design", "architect", "plans", "drawing", "blueprints"})),
+    # FLOW 4: Pricing / Budget
+    ("pricing", frozenset({"price", "cost", "budget", "quote", "estimate", "fees", "expensive"})),
+    # FLOW 5: Timeline
+    ("timeline", frozenset({"how long", "timeline", "schedule", "process", "updates", "time"})),
+    # FLOW 6: Permits / Trust
+    ("permits", frozenset({"permit", "license", "insured", "warranty", "inspection", "insurance"})),
+    # FLOW 7: Why Us / Trust
+    ("why_us", frozenset({"why you", "compare", "trust", "best", "portfolio", "reviews"})),
+    # Login / Portal Check
+    ("login", frozenset({"login", "status", "portal", "files"})),
+    # Flow 2b: Follow up on Plans
+    ("start_project_followup", frozenset({"plans", "design help"})),
+]
+
+def _alternation(keywords):
+    # Longest first so multi-word phrases win over their prefixes. Keywords must start a
+    # word ("time" no longer fires on "anytime") but may end mid-word ("permits", "designer").
+    return r"\b(?:" + "|".join(re.escape(k) for k in sorted(keywords, key=len, reverse=True)) + ")"
+
+# One named group per intent inside a zero-width lookahead: a single pass over the
+# message reports every intent hit without one match swallowing another.
+INTENT_RE = re.compile(
+    "(?=" + "|".join(f"(?P<{intent}>{_alternation(keywords)})" for intent, keywords in INTENT_KEYWORDS) + ")",
+    re.IGNORECASE
+)
+INTENT_PRIORITY = {intent: rank for rank, (intent, _) in enumerate(INTENT_KEYWORDS)}
+
+# Smart Classification (Updated for 8-Flow Logic)
+@lru_cache(maxsize=1024) # Pure function of the text: "yes", "price?", button labels repeat constantly
+def classify_intent(last_msg: str) -> str:
+    """
+    Decides which FLOW (1-8) the user is currently in based on Client Requirements.
+    """
+    # Highest-priority flow mentioned anywhere in the message wins (case-insensitive, no .lower() copy)
+    best = None
+    for match in INTENT_RE.finditer(last_msg):
+        intent = match.lastgroup
+        if best is None or INTENT_PRIORITY[intent] < INTENT_PRIORITY[best]:
+            best = intent
+            if INTENT_PRIORITY[best] == 0:
+                break
+
+    # Default / General Query
+    return best or "general"
+
+# Pure greetings / acknowledgements: nothing to look up in the knowledge base
+TRIVIAL_MSG_RE = re.compile(
+    r"^\W*(hi|hello|hey|yes|yeah|no|ok|okay|sure|thanks|thank you|great|cool)\W*$",
+    re.IGNORECASE
+)
+
+# Cap on RAG text put into the general prompt (Gemini latency + cost grow with input tokens)
+MAX_CONTEXT_CHARS = 4000
+
+def _join_within_budget(docs):
+    parts = []
+    budget = MAX_CONTEXT_CHARS
+    for d in docs:
+        if budget <= 0:
+            break
+        parts.append(d.page_content[:budget])
+        budget -= len(d.page_content) + 1 # +1 for the joining newline
+    return "\n".join(parts)
+
+# Persona hints api.py prepends to the user's text (per Instagram event type / bot script).
+# Anything that needs the user's own words (trivial check, callback SMS) strips them first.
+IG_CONTEXT_PREFIXES = {
+    "comment": "[CONTEXT: User commented on an Instagram Post. Keep reply public, short, engaging, and luxury tone.] ",
+    "dm": "[CONTEXT: User sent a Direct Message. Be helpful, warm, act as a concierge.] ",
+}
+BOT_SCRIPT_PREFIX = "[Context: Reply short for Instagram Comment]: "
+CONTEXT_PREFIXES = (*IG_CONTEXT_PREFIXES.values(), BOT_SCRIPT_PREFIX)
+
+def strip_context_prefix(text: str) -> str:
+    for prefix in CONTEXT_PREFIXES:
+        if text.startswith(prefix):
+            return text[len(prefix):]
+    return text
+
+# Deterministic flows: the message already carries the one tool argument they need
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+# 10-15 digits, at most two separator chars between digits ("(555) 123-4567", "+44 20 7946 0958"),
+# not part of a longer digit run; "2024 - 2025" or an order number is not a phone
+PHONE_RE = re.compile(r"(?<!\d)\+?\(?\d(?:[\s.()-]{0,2}\d){9,14}(?!\d)")
+YEARS_RE = re.compile(r"(?:(?:19|20)\d\d[\s.-]*)+") # "2023 2024 2025": a run of years
+
+def _find_phone(text):
+    for match in PHONE_RE.finditer(text):
+        if not YEARS_RE.fullmatch(match.group()):
+            return match.group()
+    return None
+
+# One sentence (or line) plus its trailing whitespace; "2.5" and "fabdl.com" don't end one
+SENTENCE_RE = re.compile(r"[^\n]*?(?:[.!?](?=\s|$)|\n|$)\s*")
+META_CHUNK_LIMIT = 950 # Meta rejects texts over 1000 chars (50 chars buffer)
+
+def split_message(text: str, limit: int = META_CHUNK_LIMIT) -> List[str]:
+    """Greedily packs whole sentences into chunks of at most `limit` chars (bullets/newlines kept)."""
+    chunks, buf = [], ""
+    for sentence in SENTENCE_RE.findall(text):
+        if buf and len(buf) + len(sentence) > limit:
+            chunks.append(buf.rstrip())
+            buf = ""
+        while len(sentence) > limit: # A single oversized sentence: hard cut
+            chunks.append(sentence[:limit])
+            sentence = sentence[limit:]
+        buf += sentence
+    if buf.strip():
+        chunks.append(buf.rstrip())
+    return chunks
@@ -0,0 +1,159 @@
+import os
+import re
+import time
+import asyncio
+import numpy as np
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Cosine similarity above which a new query reuses a cached retrieval
+CACHE_SIM_THRESHOLD = float(os.getenv("CACHE_SIM_THRESHOLD", "0.95"))
+# Seconds a cached retrieval stays valid, so knowledge-base edits reach users without a restart
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "900"))
+
+# Punctuation at word edges only: "3.5", "don't" and emails keep theirs
+_PUNCT_RE = re.compile(r"(?<!\w)[^\w\s]+|[^\w\s]+(?!\w)")
+
+def normalize_query(text):
+    """Lowercase, drop edge punctuation, collapse whitespace: 'Price?' and 'price' share one cache key."""
+    return " ".join(_PUNCT_RE.sub(" ", text.lower()).split())
+
+def _normalize(vector):
+    v = np.asarray(vector, dtype=np.float32)
+    return v / (np.linalg.norm(v) + 1e-12)
+
+class SemanticCache:
+    """
+    In-memory semantic cache for Pinecone retrievals.
+    Stores (query embedding -> context text). A new query whose embedding is
+    close enough to a cached one reuses that context instead of hitting Pinecone.
+    Least-recently-used entry is evicted once the cache is full; entries older
+    than `ttl` seconds are ignored by lookups.
+    Vectors are L2-normalized on insert and kept as float16 (half the RAM of
+    float32 per 3072-dim entry), so a lookup is a single matrix-vector dot
+    product accumulated in float32.
+    """
+    def __init__(self, max_entries=512, threshold=CACHE_SIM_THRESHOLD, ttl=CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        self._vectors = None # Allocated on first store (dimension known then)
+        self._last_used = np.zeros(max_entries, dtype=np.int64)
+        self._stored_at = np.zeros(max_entries, dtype=np.float64)
+        self._contexts = []
+        self._tick = 0
+
+    def lookup(self, query_vector):
+        """Returns cached context for a similar query, or None on a miss."""
+        size = len(self._contexts)
+        if not size:
+            return None
+
+        q = _normalize(query_vector)
+        sims = np.matmul(self._vectors[:size], q, dtype=np.float32)
+        # Expired entries never match; no longer touched, they age out of the LRU
+        sims[self._stored_at[:size] < time.monotonic() - self.ttl] = -1.0
+        best = int(np.argmax(sims))
+        if sims[best] < self.threshold:
+            return None
+
+        self._tick += 1
+        self._last_used[best] = self._tick
+        return self._contexts[best]
+
+    def store(self, query_vector, context):
+        q = _normalize(query_vector)
+        if self._vectors is None:
+            self._vectors = np.zeros((self.max_entries, q.shape[0]), dtype=np.float16)
+
+        size = len(self._contexts)
+        if size < self.max_entries:
+            slot = size
+            self._contexts.append(context)
+        else:
+            # Evict the least recently used entry
+            slot = int(np.argmin(self._last_used))
+            self._contexts[slot] = context
+
+        self._vectors[slot] = q # Downcast to float16 on assignment
+        self._stored_at[slot] = time.monotonic()
+        self._tick += 1
+        self._last_used[slot] = self._tick
+
+class EmbeddingBatcher:
+    """
+    Coalesces query embeddings from concurrent sessions into one API call.
+    Queries arriving within `window` seconds (or until `max_batch` is reached)
+    are sent together via `aembed_documents`; each caller gets its own vector back.
+    Repeated queries ("hi", "Kitchen renovation?") are served from an LRU cache keyed
+    on the normalized text; identical queries already in flight share one request.
+    The normalized form is only a key: the API always embeds the original text.
+    """
+    def __init__(self, embeddings, window=0.01, max_batch=32, cache_size=2048):
+        self.embeddings = embeddings
+        self.window = window
+        self.max_batch = max_batch
+        self.cache_size = cache_size
+        self._cache = OrderedDict() # normalized text -> vector
+        self._inflight = {} # normalized text -> future (queued or being embedded)
+        self._pending = [] # [(normalized text, original text, future)]
+        self._flush_handle = None
+        self._tasks = set() # Strong refs: the loop only weakly references running batches
+
+    async def embed(self, text):
+        key = normalize_query(text) or text # Pure punctuation/emoji: keep as-is
+        vector = self._cache.get(key)
+        if vector is not None:
+            self._cache.move_to_end(key)
+            return vector
+
+        # Futures are shared between sessions: shield them, so one caller being
+        # cancelled (e.g. a client disconnect) doesn't cancel everyone else's embed
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._inflight[key] = future
+        self._pending.append((key, text, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        try:
+            vectors = await self.embeddings.aembed_documents([text for _, text, _ in batch])
+        except Exception as e:
+            for key, _, future in batch:
+                self._inflight.pop(key, None)
+                if not future.done(): future.set_exception(e)
+            return
+
+        for (key, _, future), vector in zip(batch, vectors):
+            self._remember(key, vector)
+            self._inflight.pop(key, None)
+            if not future.done(): future.set_result(vector)
+
+    def _remember(self, key, vector):
+        self._cache[key] = vector
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
@@ -0,0 +1,134 @@
+from types import SimpleNamespace
+
+import pytest
+
+from message_rules import (
+    BOT_SCRIPT_PREFIX,
+    IG_CONTEXT_PREFIXES,
+    MAX_CONTEXT_CHARS,
+    TRIVIAL_MSG_RE,
+    _find_phone,
+    _join_within_budget,
+    classify_intent,
+    split_message,
+    strip_context_prefix,
+)
+
+
+# --- split_message ---
+
+def test_split_message_short_text_is_one_chunk():
+    assert split_message("Hello there. How can we help?") == ["Hello there. How can we help?"]
+
+
+def test_split_message_empty_text_has_no_chunks():
+    assert split_message("") == []
+    assert split_message("   \n ") == []
+
+
+def test_split_message_packs_whole_sentences_within_limit():
+    text = "One two three. Four five six. Seven eight nine."
+    chunks = split_message(text, limit=30)
+
+    assert chunks == ["One two three. Four five six.", "Seven eight nine."]
+    assert all(len(c) <= 30 for c in chunks)
+
+
+def test_split_message_does_not_break_on_decimals_or_domains():
+    text = "Budget is 2.5 million. Visit fabdl.com for more."
+    assert split_message(text, limit=25) == ["Budget is 2.5 million.", "Visit fabdl.com for more."]
+
+
+def test_split_message_keeps_bullet_lines():
+    text = "Options:\n- Kitchen\n- Bath\n"
+    assert split_message(text, limit=20) == ["Options:\n- Kitchen", "- Bath"]
+
+
+def test_split_message_hard_cuts_oversized_sentence():
+    chunks = split_message("x" * 25, limit=10)
+    assert chunks == ["x" * 10, "x" * 10, "x" * 5]
+
+
+# --- _find_phone ---
+
+@pytest.mark.parametrize("text, phone", [
+    ("call me at (555) 123-4567 please", "(555) 123-4567"),
+    ("my number is +44 20 7946 0958", "+44 20 7946 0958"),
+    ("5551234567", "5551234567"),
+    ("reach me on 555.123.4567.", "555.123.4567"),
+])
+def test_find_phone_matches_common_formats(text, phone):
+    assert _find_phone(text) == phone
+
+
+@pytest.mark.parametrize("text", [
+    "we built it 2023 2024 2025",
+    "projects from 2019 - 2024",
+    "order 1234567890123456789",
+    "call me at 555-1234",
+    "no digits here",
+])
+def test_find_phone_rejects_non_phones(text):
+    assert _find_phone(text) is None
+
+
+def test_find_phone_skips_year_run_before_real_number():
+    assert _find_phone("2023 2024 2025, call 555 123 4567") == "555 123 4567"
+
+
+# --- classify_intent ---
+
+@pytest.mark.parametrize("text, intent", [
+    ("Can I talk to someone about the price?", "handoff"),
+    ("What would it cost to renovate?", "start_project"),
+    ("How much time does the design take?", "design"),
+    ("Is the quote for the permit included?", "pricing"),
+    ("What's your timeline and are you insured?", "timeline"),
+    ("Can I check my portal status?", "login"),
+    ("PRICE?", "pricing"),
+])
+def test_classify_intent_highest_priority_flow_wins(text, intent):
+    assert classify_intent(text) == intent
+
+
+def test_classify_intent_keywords_must_start_a_word():
+    assert classify_intent("Reply anytime") == "general"
+    assert classify_intent("Do you have designers?") == "design"
+
+
+def test_classify_intent_defaults_to_general():
+    assert classify_intent("hello") == "general"
+
+
+# --- context prefixes / trivial messages ---
+
+@pytest.mark.parametrize("prefix", [*IG_CONTEXT_PREFIXES.values(), BOT_SCRIPT_PREFIX])
+def test_strip_context_prefix_leaves_users_own_text(prefix):
+    assert strip_context_prefix(prefix + "thanks!") == "thanks!"
+    assert TRIVIAL_MSG_RE.match(strip_context_prefix(prefix + "thanks!"))
+
+
+def test_strip_context_prefix_without_prefix_is_unchanged():
+    assert strip_context_prefix("ok") == "ok"
+    assert not TRIVIAL_MSG_RE.match("ok, how much is a kitchen?")
+
+
+# --- _join_within_budget ---
+
+def _docs(*texts):
+    return [SimpleNamespace(page_content=t) for t in texts]
+
+
+def test_join_within_budget_joins_docs_under_budget():
+    assert _join_within_budget(_docs("alpha", "beta")) == "alpha\nbeta"
+
+
+def test_join_within_budget_truncates_to_max_chars():
+    joined = _join_within_budget(_docs("a" * (MAX_CONTEXT_CHARS - 10), "b" * 100, "c" * 100))
+
+    assert len(joined) <= MAX_CONTEXT_CHARS
+    assert joined == "a" * (MAX_CONTEXT_CHARS - 10) + "\n" + "b" * 9
+
+
+def test_join_within_budget_empty_docs():
+    assert _join_within_budget([]) == ""
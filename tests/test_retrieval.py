@@ -0,0 +1,197 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("dotenv")
+
+import retrieval
+from retrieval import SemanticCache, EmbeddingBatcher, normalize_query
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class FakeEmbeddings:
+    """Records every aembed_documents batch; returns [len(text), 1.0] per text."""
+    def __init__(self, fail=None, gate=None):
+        self.calls = []
+        self.fail = fail
+        self.gate = gate
+
+    async def aembed_documents(self, texts):
+        self.calls.append(list(texts))
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.fail is not None:
+            raise self.fail
+        return [[float(len(t)), 1.0] for t in texts]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(retrieval, "time", SimpleNamespace(monotonic=fake.monotonic))
+    return fake
+
+
+# --- normalize_query ---
+
+def test_normalize_query_strips_edge_punctuation_only():
+    assert normalize_query("  Price?? ") == "price"
+    assert normalize_query("Is it $3.5k?") == "is it 3.5k"
+    assert normalize_query("don't") == "don't"
+
+
+# --- SemanticCache ---
+
+def test_cache_hit_for_similar_vector_and_miss_below_threshold(clock):
+    cache = SemanticCache(max_entries=4, threshold=0.95)
+    cache.store([1.0, 0.0, 0.0], "kitchen")
+
+    assert cache.lookup([0.99, 0.05, 0.0]) == "kitchen"
+    assert cache.lookup([0.0, 1.0, 0.0]) is None
+
+
+def test_cache_empty_lookup_is_miss(clock):
+    assert SemanticCache().lookup([1.0, 0.0]) is None
+
+
+def test_cache_evicts_least_recently_used(clock):
+    cache = SemanticCache(max_entries=2, threshold=0.95)
+    cache.store([1.0, 0.0, 0.0], "a")
+    cache.store([0.0, 1.0, 0.0], "b")
+    assert cache.lookup([1.0, 0.0, 0.0]) == "a" # "b" is now the LRU entry
+
+    cache.store([0.0, 0.0, 1.0], "c")
+
+    assert cache.lookup([1.0, 0.0, 0.0]) == "a"
+    assert cache.lookup([0.0, 1.0, 0.0]) is None
+    assert cache.lookup([0.0, 0.0, 1.0]) == "c"
+
+
+def test_cache_entries_expire_after_ttl(clock):
+    cache = SemanticCache(max_entries=4, threshold=0.95, ttl=60)
+    cache.store([1.0, 0.0], "old")
+
+    clock.now += 59
+    assert cache.lookup([1.0, 0.0]) == "old"
+
+    clock.now += 2
+    assert cache.lookup([1.0, 0.0]) is None
+
+
+def test_cache_restore_refreshes_ttl(clock):
+    cache = SemanticCache(max_entries=1, threshold=0.95, ttl=60)
+    cache.store([1.0, 0.0], "old")
+    clock.now += 61
+    cache.store([1.0, 0.0], "new")
+
+    assert cache.lookup([1.0, 0.0]) == "new"
+
+
+# --- EmbeddingBatcher ---
+
+def test_batcher_coalesces_concurrent_queries_into_one_call():
+    async def scenario():
+        embeddings = FakeEmbeddings()
+        batcher = EmbeddingBatcher(embeddings, window=0.01)
+        vectors = await asyncio.gather(batcher.embed("hi"), batcher.embed("kitchen"), batcher.embed("bath"))
+        return embeddings.calls, vectors
+
+    calls, vectors = asyncio.run(scenario())
+
+    assert calls == [["hi", "kitchen", "bath"]]
+    assert vectors == [[2.0, 1.0], [7.0, 1.0], [4.0, 1.0]]
+
+
+def test_batcher_flushes_at_max_batch():
+    async def scenario():
+        embeddings = FakeEmbeddings()
+        batcher = EmbeddingBatcher(embeddings, window=10, max_batch=2)
+        await asyncio.wait_for(asyncio.gather(batcher.embed("a"), batcher.embed("b")), timeout=1)
+        return embeddings.calls
+
+    assert asyncio.run(scenario()) == [["a", "b"]]
+
+
+def test_batcher_dedupes_in_flight_queries_and_embeds_original_text():
+    async def scenario():
+        embeddings = FakeEmbeddings()
+        batcher = EmbeddingBatcher(embeddings, window=0.01)
+        vectors = await asyncio.gather(batcher.embed("Price?"), batcher.embed("price"))
+        return embeddings.calls, vectors
+
+    calls, vectors = asyncio.run(scenario())
+
+    assert calls == [["Price?"]]
+    assert vectors[0] == vectors[1]
+
+
+def test_batcher_serves_repeats_from_cache():
+    async def scenario():
+        embeddings = FakeEmbeddings()
+        batcher = EmbeddingBatcher(embeddings, window=0)
+        first = await batcher.embed("Kitchen renovation?")
+        second = await batcher.embed("kitchen renovation")
+        return embeddings.calls, first, second
+
+    calls, first, second = asyncio.run(scenario())
+
+    assert calls == [["Kitchen renovation?"]]
+    assert first == second
+
+
+def test_batcher_cache_is_lru_bounded():
+    async def scenario():
+        embeddings = FakeEmbeddings()
+        batcher = EmbeddingBatcher(embeddings, window=0, cache_size=2)
+        for text in ("a", "b", "a", "c", "b"):
+            await batcher.embed(text)
+        return embeddings.calls
+
+    # "b" was the LRU key when "c" arrived, so it is embedded again
+    assert asyncio.run(scenario()) == [["a"], ["b"], ["c"], ["b"]]
+
+
+def test_batcher_propagates_errors_to_every_caller_and_allows_retry():
+    async def scenario():
+        embeddings = FakeEmbeddings(fail=RuntimeError("quota"))
+        batcher = EmbeddingBatcher(embeddings, window=0.01)
+        results = await asyncio.gather(batcher.embed("hi"), batcher.embed("Hi!"), batcher.embed("bath"), return_exceptions=True)
+
+        embeddings.fail = None
+        retry = await batcher.embed("hi")
+        return embeddings.calls, results, retry
+
+    calls, results, retry = asyncio.run(scenario())
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert calls == [["hi", "bath"], ["hi"]]
+    assert retry == [2.0, 1.0]
+
+
+def test_batcher_cancelled_caller_does_not_cancel_shared_embed():
+    async def scenario():
+        gate = asyncio.Event()
+        embeddings = FakeEmbeddings(gate=gate)
+        batcher = EmbeddingBatcher(embeddings, window=0)
+        first = asyncio.ensure_future(batcher.embed("hi"))
+        second = asyncio.ensure_future(batcher.embed("hi"))
+        await asyncio.sleep(0.01)
+
+        first.cancel()
+        gate.set()
+        return first, await second, embeddings.calls
+
+    first, vector, calls = asyncio.run(scenario())
+
+    assert first.cancelled()
+    assert vector == [2.0, 1.0]
+    assert calls == [["hi"]]
@@ -1,9 +1,12 @@
 import os
-import requests
 import json
+import logging
 from dotenv import load_dotenv
+from http_clients import async_client
 
 load_dotenv()
+# Runs on the event loop: log (queued by api.py's QueueHandler) instead of blocking print
+logger = logging.getLogger("LOFTY_WIX")
 
 # Aapko Wix se ek URL milega (Setup step mein bataunga)
 # Example: https://www.fandldesignbuilders.com/_functions/add_subscriber
@@ -17,44 +20,47 @@ class WixManager:
         else:
             self.active = True
 
-    def add_contact_to_wix(self, name, email, phone):
+    def _build_payload(self, name, email, phone):
+        # Splitting Name
+        name_parts = name.strip().split(" ")
+        first_name = name_parts[0]
+        last_name = " ".join(name_parts[1:]) if len(name_parts) > 1 else ""
+
+        return {
+            "firstName": first_name,
+            "lastName": last_name,
+            "email": email,
+            "phone": phone,
+            "source": "LOFTY AI Chatbot"
+        }
+
+    def _handle_response(self, response):
+        if response.status_code == 200 or response.status_code == 201:
+            logger.info("✅ Successfully added to Wix Newsletter!")
+            return True
+        else:
+            logger.warning("⚠️ Wix Sync Failed: %s", response.text)
+            return False
+
+    async def aadd_contact_to_wix(self, name, email, phone):
         """
         Sends Lead Data to Wix Contacts & Newsletter.
+        Runs on the shared keep-alive httpx client (the agent's tools are async).
         """
         if not self.active:
             return "Skipped (No URL)"
 
-        print(f"📨 Syncing Lead to Wix: {email}...")
-        
+        logger.info("📨 Syncing Lead to Wix: %s...", email)
+
         try:
-            # Splitting Name
-            name_parts = name.strip().split(" ")
-            first_name = name_parts[0]
-            last_name = " ".join(name_parts[1:]) if len(name_parts) > 1 else ""
-
-            payload = {
-                "firstName": first_name,
-                "lastName": last_name,
-                "email": email,
-                "phone": phone,
-                "source": "LOFTY AI Chatbot"
-            }
-
-            # Sending Request to Wix Webhook
-            response = requests.post(
-                WIX_WEBHOOK_URL, 
-                json=payload,
+            response = await async_client.post(
+                WIX_WEBHOOK_URL,
+                json=self._build_payload(name, email, phone),
                 headers={"Content-Type": "application/json"},
                 timeout=10
             )
-
-            if response.status_code == 200 or response.status_code == 201:
-                print("✅ Successfully added to Wix Newsletter!")
-                return True
-            else:
-                print(f"⚠️ Wix Sync Failed: {response.text}")
-                return False
+            return self._handle_response(response)
 
         except Exception as e:
-            print(f"❌ Wix Error: {e}")
+            logger.error("❌ Wix Error: %s", e)
             return False
\ No newline at end of file